@@ -3,9 +3,14 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
-import numpy_financial as npf
+import os
 from io import BytesIO
 from datetime import datetime, date, timedelta
+from finance_core import (
+    FinancialEngine, FxRateTable, LEDGER_COLUMNS, PIPELINE_COLUMNS, COST_LIBRARY_COLUMNS,
+    FX_COLUMNS, FX_RATES_FILE, REPORTING_CURRENCY, CURRENCIES,
+    prepare_ledger, compute_kpis, compute_scorecard, build_pnl, build_balance, build_cash_flow
+)
 
 # --- 1. CONFIGURACIÓN GLOBAL & DISEÑO PROFESIONAL ---
 st.set_page_config(
@@ -123,31 +128,77 @@ st.markdown("""
 
 # --- 2. LÓGICA DE NEGOCIO ---
 
-class FinancialEngine:
+# FinancialEngine y los estados financieros viven en finance_core.py (compartidos con close_batch.py)
+
+# --- 2.1 CAPA DE GRÁFICOS (CACHÉ + PAYLOAD LIVIANO) ---
+MAX_SCATTER_POINTS = 1500
+HISTOGRAM_BINS = 60
+
+class ChartEngine:
+    @staticmethod
+    def cached_figure(name, cache_key, builder):
+        # Memoiza la figura por nombre y versión de los datos de entrada; solo se reconstruye si cambia la llave
+        cache = st.session_state.setdefault('_fig_cache', {})
+        hit = cache.get(name)
+        if hit is not None and hit[0] == cache_key:
+            return hit[1]
+        fig = builder()
+        cache[name] = (cache_key, fig)
+        return fig
+
+    @staticmethod
+    def downsample(df, max_points=MAX_SCATTER_POINTS, stratify_by=None):
+        # Muestreo determinístico proporcional por grupo para carteras grandes
+        if len(df) <= max_points:
+            return df
+        frac = max_points / len(df)
+        if stratify_by and stratify_by in df.columns:
+            return df.groupby(stratify_by, group_keys=False, observed=True).sample(frac=frac, random_state=0)
+        return df.sample(n=max_points, random_state=0)
+
     @staticmethod
-    def calculate_dcf(investment, cash_flows, rate):
-        cash_flow_series = [-investment] + cash_flows
-        vpn = npf.npv(rate, cash_flow_series)
-        tir = npf.irr(cash_flow_series)
-        return vpn, tir
+    def histogram(values, title, bins=HISTOGRAM_BINS, color='#6366f1'):
+        # Histograma pre-agrupado en el servidor: se envían solo los conteos, no las muestras
+        counts, edges = np.histogram(np.asarray(values, dtype=float), bins=bins)
+        centers = (edges[:-1] + edges[1:]) / 2
+        fig = go.Figure(go.Bar(x=centers, y=counts, width=np.diff(edges), marker_color=color))
+        fig.update_layout(template="plotly_dark", title=title, bargap=0, yaxis_title="Frecuencia")
+        return fig
+
+    @staticmethod
+    def portfolio_map(df_p):
+        df_plot = ChartEngine.downsample(df_p, stratify_by='Estado')
+        fig = px.scatter(
+            df_plot, x="Ingresos_Est", y="Margen_Est", size="Size_Plot",
+            color="Estado", title="Mapa de Valor vs Rentabilidad",
+            hover_data=['Nombre_Proyecto', 'Horas_Est'],
+            labels={'Size_Plot': 'Esfuerzo'}
+        )
+        if len(df_plot) < len(df_p):
+            fig.update_layout(title=f"Mapa de Valor vs Rentabilidad (muestra {len(df_plot):,} de {len(df_p):,})")
+        fig.update_layout(template="plotly_dark") # Tema oscuro para gráfico
+        return fig
+
+    @staticmethod
+    def sales_funnel(df_pipe):
+        funnel_df = df_pipe.groupby('Etapa')['Valor'].sum().reset_index()
+        orden = ["Lead", "Propuesta", "Negociación", "Ganado", "Perdido"]
+        funnel_df['Etapa'] = pd.Categorical(funnel_df['Etapa'], categories=orden, ordered=True)
+        funnel_df = funnel_df.sort_values('Etapa')
+
+        fig = px.funnel(funnel_df, x='Valor', y='Etapa', title="Embudo de Ventas")
+        fig.update_layout(template="plotly_dark")
+        return fig
 
     @staticmethod
-    def classify_expense_auto(concepto):
-        concepto = concepto.lower()
-        mapping = {
-            'taxi': 'Gastos de Viaje', 'uber': 'Gastos de Viaje', 'vuelo': 'Gastos de Viaje',
-            'almuerzo': 'Gastos de Representación', 'restaurante': 'Gastos de Representación',
-            'nómina': 'Beneficios a Empleados', 'sueldo': 'Beneficios a Empleados',
-            'licencia': 'Amortización Intangibles', 'software': 'Amortización Intangibles',
-            'computador': 'Propiedad, Planta y Equipo', 'silla': 'Propiedad, Planta y Equipo',
-            'arriendo': 'Gastos por Arrendamiento (NIIF 16)', 'oficina': 'Gastos por Arrendamiento (NIIF 16)',
-            'banco': 'Gastos Financieros', 'interés': 'Gastos Financieros',
-            'cliente': 'Cuentas por Cobrar', 'factura': 'Cuentas por Pagar'
-        }
-        for key, val in mapping.items():
-            if key in concepto:
-                return val
-        return "Otros Gastos Operacionales"
+    def growth_waterfall(base_ingresos, val_crm, val_pric):
+        fig = go.Figure(go.Waterfall(
+            x = ["Base", "CRM", "Cartera", "Total"],
+            y = [base_ingresos, val_crm, val_pric, 0],
+            measure = ["relative", "relative", "relative", "total"]
+        ))
+        fig.update_layout(template="plotly_dark")
+        return fig
 
 # --- 3. INICIALIZACIÓN DE ESTADO (BD) ---
 def init_session_state():
@@ -164,6 +215,8 @@ def init_session_state():
     
     if 'Comportamiento' not in st.session_state['ledger'].columns:
         st.session_state['ledger']['Comportamiento'] = 'Fijo'
+    if 'Moneda' not in st.session_state['ledger'].columns:
+        st.session_state['ledger']['Moneda'] = REPORTING_CURRENCY
 
     # B. PIPELINE CRM
     if 'pipeline' not in st.session_state:
@@ -175,6 +228,9 @@ def init_session_state():
         ]
         st.session_state['pipeline'] = pd.DataFrame(data_pipe)
 
+    if 'Moneda' not in st.session_state['pipeline'].columns:
+        st.session_state['pipeline']['Moneda'] = REPORTING_CURRENCY
+
     # C. LIBRERÍA DE COSTOS
     if 'cost_library' not in st.session_state:
         st.session_state['cost_library'] = pd.DataFrame([
@@ -182,6 +238,9 @@ def init_session_state():
             {'Nombre': 'Licencia Cloud', 'Unidad': 'Mensual', 'Costo_Unitario': 25000, 'Categoria': 'Tecnología'},
         ])
 
+    if 'Moneda' not in st.session_state['cost_library'].columns:
+        st.session_state['cost_library']['Moneda'] = REPORTING_CURRENCY
+
     # D. CARTERA DE PROYECTOS (ESTRUCTURA ACTUALIZADA PARA ITEMS)
     if 'projects_db' not in st.session_state:
         # Se agrega columna 'Items' para guardar el detalle de costos
@@ -197,6 +256,66 @@ def init_session_state():
     if 'marketing_spend' not in st.session_state:
         st.session_state['marketing_spend'] = 1000000
 
+    # F. VERSIONES DE DATOS (invalidación de caché de gráficos)
+    if 'data_version' not in st.session_state:
+        st.session_state['data_version'] = {'ledger': 0, 'pipeline': 0, 'cost_library': 0, 'projects_db': 0, 'fx_rates': 0}
+
+    # G. TIPOS DE CAMBIO (archivo local opcional, ampliable con Carga Masiva en Módulo 4)
+    if 'fx_rates' not in st.session_state:
+        if os.path.exists(FX_RATES_FILE):
+            st.session_state['fx_rates'] = pd.read_csv(FX_RATES_FILE)
+        else:
+            st.session_state['fx_rates'] = pd.DataFrame(columns=FX_COLUMNS)
+
+def bump_data_version(key):
+    versions = st.session_state['data_version']
+    versions[key] = versions.get(key, 0) + 1
+
+def cached_dataset(name, cache_key, builder):
+    # Igual que ChartEngine.cached_figure, pero para tablas derivadas (p. ej. montos en moneda de reporte)
+    cache = st.session_state.setdefault('_data_cache', {})
+    hit = cache.get(name)
+    if hit is not None and hit[0] == cache_key:
+        return hit[1]
+    data = builder()
+    cache[name] = (cache_key, data)
+    return data
+
+def get_fx_table():
+    # La tabla conserva su caché interno por (moneda, periodo) mientras no cambien las tasas
+    return cached_dataset('fx_table', st.session_state['data_version']['fx_rates'],
+                          lambda: FxRateTable(st.session_state['fx_rates']))
+
+def cached_reporting(name, source_key, convert):
+    # Versión en moneda de reporte de un dataset, memoizada por (versión del dataset, versión de tasas).
+    # Libro y pipeline solo crecen por pd.concat (formulario y Carga Masiva), así que si las tasas no
+    # cambiaron se convierten solo las filas nuevas y se anexan a la tabla ya convertida.
+    versions = st.session_state['data_version']
+    cache_key = (versions[source_key], versions['fx_rates'])
+    cache = st.session_state.setdefault('_data_cache', {})
+    hit = cache.get(name)
+    if hit is not None and hit[0] == cache_key:
+        return hit[1]
+    source = st.session_state[source_key]
+    try:
+        if hit is not None and hit[0][1] == versions['fx_rates'] and len(source) >= len(hit[1]):
+            data = pd.concat([hit[1], convert(source.iloc[len(hit[1]):])], ignore_index=True)
+        else:
+            data = convert(source)
+    except ValueError as e:
+        st.error(f"Error: {e}")
+        st.stop()
+    cache[name] = (cache_key, data)
+    return data
+
+def get_reporting_ledger():
+    return cached_reporting('ledger_reporting', 'ledger',
+                            lambda df: get_fx_table().convert(prepare_ledger(df), ['Monto']))
+
+def get_reporting_pipeline():
+    return cached_reporting('pipeline_reporting', 'pipeline',
+                            lambda df: get_fx_table().convert(df, ['Valor'], date_col='Fecha_Cierre'))
+
 init_session_state()
 
 # --- 4. COMPONENTE DE CARGA MASIVA ---
@@ -218,6 +337,7 @@ def render_bulk_loader(target_key, cols, title):
                         if col not in df_new.columns:
                             df_new[col] = 0 if 'Monto' in col else ''
                     st.session_state[target_key] = pd.concat([st.session_state[target_key], df_new], ignore_index=True)
+                    bump_data_version(target_key)
                     st.success("Carga exitosa")
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -268,6 +388,7 @@ if menu == "1. Operaciones Diarias":
                 
                 comportamiento = c2.selectbox("Comportamiento", ["Fijo", "Variable"])
                 monto = c1.number_input("Monto", min_value=0.0)
+                moneda = c2.selectbox("Moneda", CURRENCIES)
                 
                 proyectos_crm = ["General"] + st.session_state['pipeline']['Proyecto'].unique().tolist()
                 proyecto = c2.selectbox("Proyecto Asociado", proyectos_crm)
@@ -278,14 +399,15 @@ if menu == "1. Operaciones Diarias":
                         'Fecha': datetime.combine(fecha, datetime.min.time()),
                         'Concepto': concepto, 'Entidad': entidad, 'Tipo': tipo,
                         'Clasificacion_NIC': clasif_nic, 'Monto': monto * signo,
-                        'Proyecto': proyecto, 'Estado': 'Pendiente', 'Comportamiento': comportamiento
+                        'Proyecto': proyecto, 'Estado': 'Pendiente', 'Comportamiento': comportamiento,
+                        'Moneda': moneda
                     }
                     st.session_state['ledger'] = pd.concat([st.session_state['ledger'], pd.DataFrame([new_row])], ignore_index=True)
+                    bump_data_version('ledger')
                     st.success("Registrado correctamente")
 
     with tab_ops2:
-        cols_ledger = ['Fecha', 'Concepto', 'Entidad', 'Tipo', 'Clasificacion_NIC', 'Monto', 'Proyecto', 'Estado', 'Comportamiento']
-        render_bulk_loader('ledger', cols_ledger, "Libro Diario")
+        render_bulk_loader('ledger', LEDGER_COLUMNS, "Libro Diario")
         st.dataframe(st.session_state['ledger'].sort_values('Fecha', ascending=False), use_container_width=True)
 
 # =============================================================================
@@ -370,12 +492,17 @@ elif menu == "2. Pricing & Cartera":
                 if st.button("➕ Añadir Item"):
                     if not lib.empty:
                         row = lib[lib['Nombre']==item].iloc[0]
-                        st.session_state['temp_items'].append({
-                            'Item': item, 
-                            'Costo_Unit': float(row['Costo_Unitario']),
-                            'Cantidad': qty,
-                            'Costo_Total': float(row['Costo_Unitario']) * qty
-                        })
+                        try:
+                            # Costos en moneda de reporte (tasa vigente hoy)
+                            costo_unit = float(row['Costo_Unitario']) * get_fx_table().rate(row.get('Moneda'))
+                            st.session_state['temp_items'].append({
+                                'Item': item, 
+                                'Costo_Unit': costo_unit,
+                                'Cantidad': qty,
+                                'Costo_Total': costo_unit * qty
+                            })
+                        except ValueError as e:
+                            st.error(f"Error: {e}")
                     else:
                         st.error("Librería vacía")
                 
@@ -433,6 +560,7 @@ elif menu == "2. Pricing & Cartera":
                     else:
                         st.session_state['projects_db'] = pd.concat([df_current, pd.DataFrame([new_p])], ignore_index=True)
                         st.success(f"Proyecto '{p_nom}' creado exitosamente.")
+                    bump_data_version('projects_db')
                     
                     st.session_state['temp_items'] = [] # Limpiar tras guardar
 
@@ -453,13 +581,10 @@ elif menu == "2. Pricing & Cartera":
             st.dataframe(df_p.drop(columns=['Size_Plot', 'Items'], errors='ignore'), use_container_width=True)
             
             try:
-                fig_bub = px.scatter(
-                    df_p, x="Ingresos_Est", y="Margen_Est", size="Size_Plot", 
-                    color="Estado", title="Mapa de Valor vs Rentabilidad",
-                    hover_data=['Nombre_Proyecto', 'Horas_Est'],
-                    labels={'Size_Plot': 'Esfuerzo'}
+                fig_bub = ChartEngine.cached_figure(
+                    'portfolio_map', st.session_state['data_version']['projects_db'],
+                    lambda: ChartEngine.portfolio_map(df_p)
                 )
-                fig_bub.update_layout(template="plotly_dark") # Tema oscuro para gráfico
                 st.plotly_chart(fig_bub, use_container_width=True)
             except Exception:
                 st.warning("Datos insuficientes para graficar.")
@@ -469,13 +594,14 @@ elif menu == "2. Pricing & Cartera":
     # --- TAB 3: LIBRERÍA ---
     with tabs_price[2]:
         st.subheader("Base de Costos y Recursos")
-        render_bulk_loader('cost_library', ['Nombre', 'Unidad', 'Costo_Unitario', 'Categoria'], "Librería")
+        render_bulk_loader('cost_library', COST_LIBRARY_COLUMNS, "Librería")
         
         # Edición en vivo
         edited_lib = st.data_editor(st.session_state['cost_library'], num_rows="dynamic", use_container_width=True)
         # Actualizar sesión inmediatamente al editar
         if not edited_lib.equals(st.session_state['cost_library']):
             st.session_state['cost_library'] = edited_lib
+            bump_data_version('cost_library')
             st.rerun() # Forzar recarga para que el dropdown de la Tab 1 se actualice
 
 # =============================================================================
@@ -485,7 +611,7 @@ elif menu == "3. CRM & Pipeline":
     st.header("🚀 CRM & Inteligencia de Ventas")
     
     tabs_crm = st.tabs(["KPIs Ventas & CAC", "Pipeline Visual", "Gestión Datos"])
-    df_pipe = st.session_state['pipeline']
+    df_pipe = get_reporting_pipeline()
     
     with tabs_crm[0]:
         st.subheader("Indicadores de Eficiencia Comercial")
@@ -508,17 +634,14 @@ elif menu == "3. CRM & Pipeline":
         k4.metric("CLV Estimado", f"${clv:,.0f}")
 
     with tabs_crm[1]:
-        funnel_df = df_pipe.groupby('Etapa')['Valor'].sum().reset_index()
-        orden = ["Lead", "Propuesta", "Negociación", "Ganado", "Perdido"]
-        funnel_df['Etapa'] = pd.Categorical(funnel_df['Etapa'], categories=orden, ordered=True)
-        funnel_df = funnel_df.sort_values('Etapa')
-        
-        fig_funnel = px.funnel(funnel_df, x='Valor', y='Etapa', title="Embudo de Ventas")
-        fig_funnel.update_layout(template="plotly_dark")
+        fig_funnel = ChartEngine.cached_figure(
+            'sales_funnel', (st.session_state['data_version']['pipeline'], st.session_state['data_version']['fx_rates']),
+            lambda: ChartEngine.sales_funnel(df_pipe)
+        )
         st.plotly_chart(fig_funnel, use_container_width=True)
 
     with tabs_crm[2]:
-        render_bulk_loader('pipeline', ['Cliente', 'Proyecto', 'Etapa', 'Valor', 'Probabilidad', 'Fecha_Cierre', 'Horas_Est'], "Pipeline")
+        render_bulk_loader('pipeline', PIPELINE_COLUMNS, "Pipeline")
         st.data_editor(st.session_state['pipeline'], num_rows="dynamic", use_container_width=True)
 
 # =============================================================================
@@ -527,32 +650,19 @@ elif menu == "3. CRM & Pipeline":
 elif menu == "4. Finanzas (EEFF)":
     st.header("📊 Estados Financieros")
     
-    df = st.session_state['ledger'].copy()
-    df['Fecha'] = pd.to_datetime(df['Fecha'])
-    df['Periodo'] = df['Fecha'].dt.to_period('M').astype(str)
+    st.caption(f"Montos expresados en {REPORTING_CURRENCY}")
+    render_bulk_loader('fx_rates', FX_COLUMNS, "Tipos de Cambio")
+    df = get_reporting_ledger()
     
     tabs_fin = st.tabs(["Indicadores Clave", "Estado de Resultados", "Balance General", "Flujo de Caja"])
     
     with tabs_fin[0]:
         st.subheader("KPIs Financieros Corporativos")
         
-        activos_cte = df[(df['Tipo']=='Activo') & (df['Clasificacion_NIC'].isin(['Efectivo y Equivalentes', 'Cuentas por Cobrar']))]['Monto'].sum()
-        pasivos_cte = abs(df[(df['Tipo']=='Pasivo') & (df['Clasificacion_NIC'].isin(['Cuentas por Pagar', 'Impuestos por Pagar']))]['Monto'].sum())
-        total_activos = df[df['Tipo']=='Activo']['Monto'].sum()
-        total_pasivos = abs(df[df['Tipo']=='Pasivo']['Monto'].sum())
-        patrimonio = abs(df[df['Tipo']=='Patrimonio']['Monto'].sum())
-        ingresos = df[df['Tipo']=='Ingreso']['Monto'].sum()
-        costos_venta = abs(df[df['Clasificacion_NIC']=='Costo de Ventas']['Monto'].sum())
-        gastos_op = abs(df[df['Clasificacion_NIC'].isin(['Gastos de Administración', 'Gastos de Ventas'])]['Monto'].sum())
-        utilidad_bruta = ingresos - costos_venta
-        ebitda = utilidad_bruta - gastos_op 
-        utilidad_neta = ebitda 
-        
-        liquidez = activos_cte / pasivos_cte if pasivos_cte > 0 else 0
-        apalancamiento = total_pasivos / patrimonio if patrimonio > 0 else 0
-        margen_bruto = (utilidad_bruta / ingresos * 100) if ingresos > 0 else 0
-        margen_neto = (utilidad_neta / ingresos * 100) if ingresos > 0 else 0
-        roi = (utilidad_neta / (total_activos if total_activos > 0 else 1)) * 100
+        kpis = compute_kpis(df)
+        margen_bruto, ebitda, margen_neto = kpis['Margen Bruto %'], kpis['EBITDA'], kpis['Margen Neto %']
+        roi, ingresos = kpis['ROI %'], kpis['Ingresos Totales']
+        liquidez, apalancamiento = kpis['Liquidez Corriente'], kpis['Apalancamiento']
         
         col1, col2, col3, col4, col5 = st.columns(5)
         col1.metric("Margen Bruto", f"{margen_bruto:.1f}%")
@@ -567,20 +677,17 @@ elif menu == "4. Finanzas (EEFF)":
 
     with tabs_fin[1]:
         st.subheader("P&L (Estado de Resultados)")
-        df_pnl = df[df['Tipo'].isin(['Ingreso', 'Gasto'])]
-        pivot_pnl = df_pnl.pivot_table(index='Clasificacion_NIC', columns='Periodo', values='Monto', aggfunc='sum', fill_value=0)
+        pivot_pnl = build_pnl(df)
         st.dataframe(pivot_pnl.style.format("${:,.0f}"), use_container_width=True)
 
     with tabs_fin[2]:
         st.subheader("Balance General")
-        df_bal = df[df['Tipo'].isin(['Activo', 'Pasivo', 'Patrimonio'])]
-        pivot_bal = df_bal.pivot_table(index='Clasificacion_NIC', columns='Periodo', values='Monto', aggfunc='sum').cumsum(axis=1).fillna(0)
+        pivot_bal = build_balance(df)
         st.dataframe(pivot_bal.style.format("${:,.0f}"), use_container_width=True)
 
     with tabs_fin[3]:
         st.subheader("Cash Flow")
-        df_cash = df[df['Estado'].isin(['Pagado', 'Cobrado', 'Pagado/Cobrado'])]
-        cash = df_cash.groupby('Periodo')['Monto'].sum()
+        cash = build_cash_flow(df)
         st.bar_chart(cash)
 
 # =============================================================================
@@ -625,9 +732,8 @@ elif menu == "5. Estrategia & Evaluación":
     with tabs_strat[1]:
         st.subheader("Simulación Monte Carlo")
         if st.button("Ejecutar Simulación"):
-            res = FinancialEngine.monte_carlo_simulation(flujo_est, flujo_est*0.5, inv, tasa, 0.27)
-            fig_hist = px.histogram(x=res, title="Distribución de VPN", color_discrete_sequence=['#6366f1'])
-            fig_hist.update_layout(template="plotly_dark")
+            res = FinancialEngine.monte_carlo_simulation(flujo_est, flujo_est*0.5, inv, tasa, 0.27, years=years)
+            fig_hist = ChartEngine.histogram(res, "Distribución de VPN")
             st.plotly_chart(fig_hist, use_container_width=True)
 
 # =============================================================================
@@ -636,9 +742,8 @@ elif menu == "5. Estrategia & Evaluación":
 elif menu == "6. Balanced Scorecard":
     st.header("🚦 Cuadro de Mando Integral (BSC)")
     
-    df_l = st.session_state['ledger']
-    ingresos_tot = df_l[df_l['Tipo']=='Ingreso']['Monto'].sum()
-    ebitda_val = ingresos_tot - abs(df_l[df_l['Tipo']=='Gasto']['Monto'].sum())
+    bsc = compute_scorecard(get_reporting_ledger(), get_reporting_pipeline())
+    ingresos_tot, ebitda_val = bsc['Ingresos Totales'], bsc['EBITDA (BSC)']
     
     col1, col2 = st.columns(2)
     with col1:
@@ -651,7 +756,7 @@ elif menu == "6. Balanced Scorecard":
     with col2:
         with st.container(border=True):
             st.subheader("2. Clientes")
-            pipe_val = st.session_state['pipeline']['Valor'].sum()
+            pipe_val = bsc['Valor Pipeline']
             st.metric("Valor Pipeline", f"${pipe_val:,.0f}")
             st.metric("NPS", "75/100")
             st.progress(0.8)
@@ -689,7 +794,7 @@ elif menu == "7. Proyecciones":
     with col2:
         with st.container(border=True):
             base_ingresos = 10000000
-            pipe = st.session_state['pipeline']
+            pipe = get_reporting_pipeline()
             val_crm = (pipe['Valor'] * (pipe['Probabilidad']/100)).sum() * factor if inc_crm else 0
             projs = st.session_state['projects_db']
             val_pric = projs['Ingresos_Est'].sum() * 0.5 * factor if inc_pric and not projs.empty else 0
@@ -699,10 +804,8 @@ elif menu == "7. Proyecciones":
             
             st.metric("Ingresos Proyectados", f"${total:,.0f}", delta=f"Crecimiento: {growth_rate:.1f}%")
             
-            fig_w = go.Figure(go.Waterfall(
-                x = ["Base", "CRM", "Cartera", "Total"],
-                y = [base_ingresos, val_crm, val_pric, 0],
-                measure = ["relative", "relative", "relative", "total"]
-            ))
-            fig_w.update_layout(template="plotly_dark")
+            fig_w = ChartEngine.cached_figure(
+                'growth_waterfall', (base_ingresos, val_crm, val_pric),
+                lambda: ChartEngine.growth_waterfall(base_ingresos, val_crm, val_pric)
+            )
             st.plotly_chart(fig_w, use_container_width=True)
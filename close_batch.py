@@ -0,0 +1,158 @@
+"""Cierre mensual por lotes (sin Streamlit).
+
+Calcula los mismos reportes de los Módulos 4, 5 y 6 (P&L, Balance General, Flujo de Caja,
+KPIs y evaluación VPN/TIR de la cartera) para una o varias empresas y periodos, en paralelo.
+
+Estructura esperada de datos (mismas columnas que las plantillas de Carga Masiva):
+
+    datos/
+        empresa_a/ ledger.xlsx  pipeline.xlsx  projects.xlsx
+        empresa_b/ ledger.parquet  pipeline.csv  projects.csv
+
+Si --data-dir contiene directamente los archivos, se procesa como una sola empresa.
+Los montos en otras monedas (columna 'Moneda') se convierten a la moneda de reporte con
+fx_rates.* de la carpeta de la empresa o, si no existe, con --fx-file.
+
+Uso:
+    python close_batch.py --data-dir datos --out cierres --period 2023-10 --period 2023-11
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+from finance_core import (
+    FxRateTable, LEDGER_COLUMNS, PIPELINE_COLUMNS, PROJECTS_COLUMNS, FX_COLUMNS,
+    prepare_ledger, cut_to_period, compute_kpis, compute_scorecard, build_pnl, build_balance, build_cash_flow, portfolio_dcf
+)
+
+READERS = {'.parquet': pd.read_parquet, '.csv': pd.read_csv, '.xlsx': pd.read_excel}
+
+
+# --- CARGA DE DATOS ---
+def find_entities(data_dir):
+    data_dir = Path(data_dir)
+    if _dataset_path(data_dir, 'ledger') is not None:
+        return {data_dir.resolve().name: data_dir}
+    return {d.name: d for d in sorted(data_dir.iterdir()) if d.is_dir() and _dataset_path(d, 'ledger') is not None}
+
+
+def _dataset_path(entity_dir, name):
+    for ext in READERS:
+        path = entity_dir / f"{name}{ext}"
+        if path.exists():
+            return path
+    return None
+
+
+def _read_dataset(entity_dir, name, default_cols):
+    path = _dataset_path(entity_dir, name)
+    if path is None:
+        return pd.DataFrame(columns=default_cols)
+    return READERS[path.suffix](path)
+
+
+def load_entity(entity_dir, fx_file=None):
+    entity_dir = Path(entity_dir)
+    if _dataset_path(entity_dir, 'fx_rates') is not None or fx_file is None:
+        fx = FxRateTable(_read_dataset(entity_dir, 'fx_rates', FX_COLUMNS))
+    else:
+        fx = FxRateTable.from_file(fx_file)
+    ledger = fx.convert(prepare_ledger(_read_dataset(entity_dir, 'ledger', LEDGER_COLUMNS)), ['Monto'])
+    pipeline = fx.convert(_read_dataset(entity_dir, 'pipeline', PIPELINE_COLUMNS), ['Valor'], date_col='Fecha_Cierre')
+    projects = _read_dataset(entity_dir, 'projects', PROJECTS_COLUMNS)
+    return ledger, pipeline, projects
+
+
+# --- CÁLCULO DEL CIERRE ---
+def build_close_report(ledger, pipeline, projects, period, rate=0.12, years=5):
+    df = cut_to_period(ledger, period)
+    kpis = {**compute_kpis(df), **compute_scorecard(df, pipeline)}
+    return {
+        'KPIs': pd.DataFrame({'Indicador': list(kpis), 'Valor': list(kpis.values())}),
+        'Estado de Resultados': build_pnl(df).reset_index(),
+        'Balance General': build_balance(df).reset_index(),
+        'Flujo de Caja': build_cash_flow(df).reset_index(),
+        'Evaluacion Cartera': portfolio_dcf(projects, rate=rate, years=years),
+    }
+
+
+# --- ESCRITURA (STREAMING) ---
+def write_excel_bundle(path, sheets):
+    # Modo write-only de openpyxl: las filas se escriben en streaming sin mantener el libro en memoria
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        ws = wb.create_sheet(title=name[:31])
+        ws.append([str(c) for c in df.columns])
+        for row in df.itertuples(index=False, name=None):
+            ws.append([None if pd.isna(v) else v for v in row])
+    wb.save(path)
+
+
+def write_parquet_bundle(path, sheets):
+    path.mkdir(parents=True, exist_ok=True)
+    for name, df in sheets.items():
+        df.columns = [str(c) for c in df.columns]
+        df.to_parquet(path / f"{name.replace(' ', '_')}.parquet", index=False)
+
+
+def run_entity_close(entity, entity_dir, periods, out_dir, fmt='xlsx', rate=0.12, years=5, fx_file=None):
+    # Un trabajo por empresa: los datos se leen y convierten una sola vez para todos sus periodos
+    ledger, pipeline, projects = load_entity(entity_dir, fx_file)
+    if not periods:
+        periods = [ledger['Periodo'].max()] if not ledger.empty else []
+    targets = []
+    for period in periods:
+        sheets = build_close_report(ledger, pipeline, projects, period, rate=rate, years=years)
+        if fmt == 'parquet':
+            target = Path(out_dir) / f"{entity}_{period}"
+            write_parquet_bundle(target, sheets)
+        else:
+            target = Path(out_dir) / f"{entity}_{period}.xlsx"
+            write_excel_bundle(target, sheets)
+        targets.append((period, target))
+    return targets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cierre mensual por lotes: EEFF, KPIs y VPN de cartera.")
+    parser.add_argument('--data-dir', required=True, help="Directorio con una subcarpeta por empresa.")
+    parser.add_argument('--out', default='cierres', help="Directorio de salida.")
+    parser.add_argument('--period', action='append', help="Periodo YYYY-MM (repetible). Por defecto, el último del libro.")
+    parser.add_argument('--entity', action='append', help="Procesar solo estas empresas (repetible).")
+    parser.add_argument('--format', choices=['xlsx', 'parquet'], default='xlsx', help="parquet requiere pyarrow.")
+    parser.add_argument('--rate', type=float, default=12.0, help="Tasa de descuento (WACC) %% para la cartera.")
+    parser.add_argument('--years', type=int, default=5, help="Horizonte de evaluación en años.")
+    parser.add_argument('--fx-file', help="Tabla de tipos de cambio (Fecha, Moneda, Tasa) en .csv o .xlsx.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Procesos en paralelo.")
+    args = parser.parse_args(argv)
+
+    entities = find_entities(args.data_dir)
+    if args.entity:
+        entities = {k: v for k, v in entities.items() if k in args.entity}
+    if not entities:
+        parser.error(f"No se encontraron datos (ledger.*) en {args.data_dir}")
+
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(run_entity_close, entity, entity_dir, args.period, args.out, args.format, args.rate / 100, args.years, args.fx_file): entity
+            for entity, entity_dir in entities.items()
+        }
+        for fut in as_completed(futures):
+            entity = futures[fut]
+            try:
+                for period, target in fut.result():
+                    print(f"✅ {entity} {period}: {target}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {entity}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
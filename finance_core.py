@@ -0,0 +1,245 @@
+import pandas as pd
+import numpy as np
+import numpy_financial as npf
+from datetime import date
+
+# --- LÓGICA DE NEGOCIO COMPARTIDA (SIN STREAMLIT) ---
+# Usada por la app (ai_studio_code.py) y por el cierre mensual por lotes (close_batch.py)
+
+LEDGER_COLUMNS = ['Fecha', 'Concepto', 'Entidad', 'Tipo', 'Clasificacion_NIC', 'Monto', 'Proyecto', 'Estado', 'Comportamiento', 'Moneda']
+PIPELINE_COLUMNS = ['Cliente', 'Proyecto', 'Etapa', 'Valor', 'Probabilidad', 'Fecha_Cierre', 'Horas_Est', 'Moneda']
+COST_LIBRARY_COLUMNS = ['Nombre', 'Unidad', 'Costo_Unitario', 'Categoria', 'Moneda']
+PROJECTS_COLUMNS = ['Nombre_Proyecto', 'Cliente', 'Estado', 'Ingresos_Est', 'Costos_Directos_Est', 'Margen_Est', 'Horas_Est']
+
+ESTADOS_CAJA = ['Pagado', 'Cobrado', 'Pagado/Cobrado']
+
+# --- MULTIMONEDA ---
+REPORTING_CURRENCY = 'CLP'
+CURRENCIES = ['CLP', 'USD', 'UF']
+FX_COLUMNS = ['Fecha', 'Moneda', 'Tasa']  # Tasa = unidades de REPORTING_CURRENCY por 1 unidad de Moneda
+FX_RATES_FILE = 'fx_rates.csv'
+
+
+class FinancialEngine:
+    @staticmethod
+    def calculate_dcf(investment, cash_flows, rate):
+        cash_flow_series = [-investment] + cash_flows
+        vpn = npf.npv(rate, cash_flow_series)
+        tir = npf.irr(cash_flow_series)
+        return vpn, tir
+
+    @staticmethod
+    def classify_expense_auto(concepto):
+        concepto = concepto.lower()
+        mapping = {
+            'taxi': 'Gastos de Viaje', 'uber': 'Gastos de Viaje', 'vuelo': 'Gastos de Viaje',
+            'almuerzo': 'Gastos de Representación', 'restaurante': 'Gastos de Representación',
+            'nómina': 'Beneficios a Empleados', 'sueldo': 'Beneficios a Empleados',
+            'licencia': 'Amortización Intangibles', 'software': 'Amortización Intangibles',
+            'computador': 'Propiedad, Planta y Equipo', 'silla': 'Propiedad, Planta y Equipo',
+            'arriendo': 'Gastos por Arrendamiento (NIIF 16)', 'oficina': 'Gastos por Arrendamiento (NIIF 16)',
+            'banco': 'Gastos Financieros', 'interés': 'Gastos Financieros',
+            'cliente': 'Cuentas por Cobrar', 'factura': 'Cuentas por Pagar'
+        }
+        for key, val in mapping.items():
+            if key in concepto:
+                return val
+        return "Otros Gastos Operacionales"
+
+    @staticmethod
+    def monte_carlo_simulation(flujo_medio, flujo_std, investment, rate, tax_rate, years=5, n_sims=10000):
+        # Simulación vectorizada: una matriz (n_sims x years) de flujos después de impuestos
+        rng = np.random.default_rng()
+        flujos = rng.normal(flujo_medio, abs(flujo_std), size=(n_sims, years)) * (1 - tax_rate)
+        descuento = (1 + rate) ** -np.arange(1, years + 1)
+        return flujos @ descuento - investment
+
+
+class FxRateTable:
+    # Tabla local de tipos de cambio con conversión vectorizada "as-of" (última tasa conocida a la fecha).
+    # Las tasas diarias se resuelven una vez por (moneda, periodo) y quedan en caché, así que convertir
+    # millones de filas es un solo lookup indexado, sin merge_asof sobre el libro completo.
+    def __init__(self, rates=None, reporting=REPORTING_CURRENCY):
+        rates = pd.DataFrame(columns=FX_COLUMNS) if rates is None else rates
+        rates = rates.dropna(subset=FX_COLUMNS).copy()
+        rates['Fecha'] = pd.to_datetime(rates['Fecha']).dt.normalize()
+        rates['Moneda'] = rates['Moneda'].astype(str).str.strip().str.upper()
+        rates['Tasa'] = pd.to_numeric(rates['Tasa'], errors='coerce')
+        self.reporting = reporting
+        self.rates = {m: g.sort_values('Fecha')[['Fecha', 'Tasa']] for m, g in rates.dropna(subset=['Tasa']).groupby('Moneda')}
+        self._period_cache = {}
+
+    @classmethod
+    def from_file(cls, path, reporting=REPORTING_CURRENCY):
+        path = str(path)
+        rates = pd.read_excel(path) if path.endswith('.xlsx') else pd.read_csv(path)
+        return cls(rates, reporting)
+
+    def period_rates(self, moneda, periodo):
+        # Tasa vigente para cada día del periodo (NaN si no hay tasa previa)
+        key = (moneda, str(periodo))
+        if key not in self._period_cache:
+            periodo = pd.Period(periodo, freq='M')
+            dias = pd.DataFrame({'Fecha': pd.date_range(periodo.start_time, periodo.end_time.normalize(), freq='D')})
+            hist = self.rates.get(moneda)
+            if hist is None:
+                dias['Tasa'] = np.nan
+            else:
+                dias = pd.merge_asof(dias, hist, on='Fecha', direction='backward')
+            dias['Moneda'] = moneda
+            self._period_cache[key] = dias
+        return self._period_cache[key]
+
+    def _normalize_currency(self, moneda):
+        return self.reporting if pd.isna(moneda) or not str(moneda).strip() else str(moneda).strip().upper()
+
+    def rate(self, moneda, fecha=None):
+        moneda = self._normalize_currency(moneda)
+        if moneda == self.reporting:
+            return 1.0
+        fecha = pd.Timestamp(fecha if fecha is not None else date.today()).normalize()
+        tasa = self.period_rates(moneda, fecha.to_period('M')).set_index('Fecha')['Tasa'].get(fecha, np.nan)
+        if pd.isna(tasa):
+            raise ValueError(f"Sin tipo de cambio {moneda}/{self.reporting} al {fecha:%Y-%m-%d}")
+        return float(tasa)
+
+    def convert(self, df, amount_cols, date_col='Fecha'):
+        # Devuelve una copia con los montos en moneda de reporte; la moneda original se conserva en 'Moneda_Origen'
+        if 'Moneda' not in df.columns:
+            return df
+        # Normalización sobre los valores distintos (pocos), no fila a fila; NaN (código -1) cae en la moneda de reporte
+        codigos, distintas = pd.factorize(df['Moneda'])
+        normalizadas = [self._normalize_currency(m) for m in distintas] + [self.reporting]
+        cod_moneda, monedas_unicas = pd.factorize(pd.Series(normalizadas))
+        cod_moneda = cod_moneda[codigos]
+        extranjeras = np.asarray(monedas_unicas != self.reporting)
+        mask = extranjeras[cod_moneda]
+
+        out = df.copy()
+        out['Moneda_Origen'] = np.asarray(monedas_unicas, dtype=object)[cod_moneda]
+        out['Moneda'] = self.reporting
+        if not mask.any():
+            return out
+
+        if date_col and date_col in df.columns:
+            fechas = pd.to_datetime(df.loc[mask, date_col], errors='coerce')
+            if fechas.dt.tz is not None:
+                # Fecha local de la transacción: se descarta la zona horaria sin desplazar el día
+                fechas = fechas.dt.tz_localize(None)
+            dias = fechas.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        else:
+            dias = np.full(int(mask.sum()), np.datetime64(date.today(), 'D'))
+        cod_ext = cod_moneda[mask]
+
+        # Fechas vacías o ilegibles quedan sin tasa (NaN) y se reportan como faltantes
+        tasas = np.full(len(dias), np.nan)
+        con_fecha = ~np.isnat(dias)
+        if con_fecha.any():
+            d = dias[con_fecha]
+            meses = d.astype('datetime64[M]')
+            # Pares (moneda, periodo) como enteros: sin objetos Period por fila
+            cod_d = cod_ext[con_fecha]
+            claves = cod_d.astype(np.int64) * 1_000_000 + meses.astype(np.int64)
+            cod_par, pares = pd.factorize(claves)
+            primera = np.empty(len(pares), dtype=np.int64)
+            primera[cod_par[::-1]] = np.arange(len(cod_par))[::-1]
+            # Tasas diarias de cada par (desde la caché por (moneda, periodo)) en un solo arreglo plano
+            bloques = [
+                self.period_rates(monedas_unicas[cod_d[i]], pd.Period(meses[i], freq='M'))['Tasa'].to_numpy()
+                for i in primera
+            ]
+            inicio = np.concatenate([[0], np.cumsum([len(b) for b in bloques])[:-1]])
+            dia_del_mes = (d - meses.astype('datetime64[D]')).astype(np.int64)
+            tasas[con_fecha] = np.concatenate(bloques)[inicio[cod_par] + dia_del_mes]
+
+        faltantes = np.isnan(tasas)
+        if faltantes.any():
+            monedas_falt = np.asarray(monedas_unicas, dtype=object)[cod_ext[faltantes]]
+            sin_tasa = sorted({f"{m} {pd.Timestamp(d):%Y-%m}" if not np.isnat(d) else f"{m} sin fecha" for m, d in zip(monedas_falt, dias[faltantes])})
+            raise ValueError(f"Sin tipo de cambio {self.reporting} para: {', '.join(sin_tasa)}")
+
+        for col in amount_cols:
+            valores = pd.to_numeric(out[col], errors='coerce').to_numpy(dtype=float, copy=True)
+            valores[mask] *= tasas
+            out[col] = valores
+        return out
+
+
+# --- ESTADOS FINANCIEROS (MÓDULO 4) ---
+def prepare_ledger(ledger):
+    # Normaliza fechas y montos y agrega 'Periodo' (YYYY-MM)
+    df = ledger.copy()
+    df['Fecha'] = pd.to_datetime(df['Fecha'])
+    df['Monto'] = pd.to_numeric(df['Monto'], errors='coerce').fillna(0)
+    df['Periodo'] = df['Fecha'].dt.to_period('M').astype(str)
+    return df
+
+
+def cut_to_period(df, period):
+    # Movimientos hasta el cierre del periodo (YYYY-MM), inclusive
+    return df[df['Periodo'] <= str(pd.Period(period, freq='M'))]
+
+
+def compute_kpis(df):
+    activos_cte = df[(df['Tipo']=='Activo') & (df['Clasificacion_NIC'].isin(['Efectivo y Equivalentes', 'Cuentas por Cobrar']))]['Monto'].sum()
+    pasivos_cte = abs(df[(df['Tipo']=='Pasivo') & (df['Clasificacion_NIC'].isin(['Cuentas por Pagar', 'Impuestos por Pagar']))]['Monto'].sum())
+    total_activos = df[df['Tipo']=='Activo']['Monto'].sum()
+    total_pasivos = abs(df[df['Tipo']=='Pasivo']['Monto'].sum())
+    patrimonio = abs(df[df['Tipo']=='Patrimonio']['Monto'].sum())
+    ingresos = df[df['Tipo']=='Ingreso']['Monto'].sum()
+    costos_venta = abs(df[df['Clasificacion_NIC']=='Costo de Ventas']['Monto'].sum())
+    gastos_op = abs(df[df['Clasificacion_NIC'].isin(['Gastos de Administración', 'Gastos de Ventas'])]['Monto'].sum())
+    utilidad_bruta = ingresos - costos_venta
+    ebitda = utilidad_bruta - gastos_op
+    utilidad_neta = ebitda
+
+    return {
+        'Ingresos Totales': ingresos,
+        'EBITDA': ebitda,
+        'Margen Bruto %': (utilidad_bruta / ingresos * 100) if ingresos > 0 else 0,
+        'Margen Neto %': (utilidad_neta / ingresos * 100) if ingresos > 0 else 0,
+        'ROI %': (utilidad_neta / (total_activos if total_activos > 0 else 1)) * 100,
+        'Liquidez Corriente': activos_cte / pasivos_cte if pasivos_cte > 0 else 0,
+        'Apalancamiento': total_pasivos / patrimonio if patrimonio > 0 else 0,
+    }
+
+
+def build_pnl(df):
+    df_pnl = df[df['Tipo'].isin(['Ingreso', 'Gasto'])]
+    return df_pnl.pivot_table(index='Clasificacion_NIC', columns='Periodo', values='Monto', aggfunc='sum', fill_value=0)
+
+
+def build_balance(df):
+    df_bal = df[df['Tipo'].isin(['Activo', 'Pasivo', 'Patrimonio'])]
+    return df_bal.pivot_table(index='Clasificacion_NIC', columns='Periodo', values='Monto', aggfunc='sum').cumsum(axis=1).fillna(0)
+
+
+def build_cash_flow(df):
+    df_cash = df[df['Estado'].isin(ESTADOS_CAJA)]
+    return df_cash.groupby('Periodo')['Monto'].sum()
+
+
+# --- BALANCED SCORECARD (MÓDULO 6) ---
+def compute_scorecard(ledger, pipeline):
+    ingresos_tot = ledger[ledger['Tipo']=='Ingreso']['Monto'].sum()
+    return {
+        'Ingresos Totales': ingresos_tot,
+        'EBITDA (BSC)': ingresos_tot - abs(ledger[ledger['Tipo']=='Gasto']['Monto'].sum()),
+        'Valor Pipeline': pipeline['Valor'].sum() if 'Valor' in pipeline.columns else 0,
+    }
+
+
+# --- EVALUACIÓN DE CARTERA (MÓDULO 5) ---
+def portfolio_dcf(projects, rate=0.12, years=5, flow_ratio=0.2):
+    # Mismos supuestos por defecto que Módulo 5: inversión = costo directo, flujo anual = 20% de la venta
+    inversiones = pd.to_numeric(projects['Costos_Directos_Est'], errors='coerce').fillna(0)
+    flujos = pd.to_numeric(projects['Ingresos_Est'], errors='coerce').fillna(0) * flow_ratio
+    rows = []
+    for nombre, cliente, inv, flujo in zip(projects['Nombre_Proyecto'], projects['Cliente'], inversiones, flujos):
+        vpn, tir = FinancialEngine.calculate_dcf(inv, [flujo] * years, rate)
+        rows.append({
+            'Nombre_Proyecto': nombre, 'Cliente': cliente,
+            'Inversion': inv, 'Flujo_Anual': flujo, 'VPN': vpn, 'TIR': tir,
+            'Payback_Anios': inv / flujo if flujo else np.nan,
+        })
+    return pd.DataFrame(rows, columns=['Nombre_Proyecto', 'Cliente', 'Inversion', 'Flujo_Anual', 'VPN', 'TIR', 'Payback_Anios'])